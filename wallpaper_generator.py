@@ -10,80 +10,309 @@ import time
 import subprocess
 import shutil
 import argparse
-import tempfile
-import urllib.parse
 import random
+import re
+import hashlib
+import functools
+import threading
+import signal
+import platform
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-try:
-    import requests
-except ImportError:
-    print("Installing requests package...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests", "--user"])
-    import requests
+# Shared HTTP session so repeated downloads reuse pooled keep-alive connections.
+# Created on first use so --help/--setup don't pay for importing requests.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Default and hard upper bound on simultaneous per-display generations against Pollinations;
+# the hard bound matches the HTTP connection pool so no worker ever waits on a socket
+MAX_CONCURRENT_DOWNLOADS = 8
+HTTP_POOL_SIZE = 16
+
+# Worker threads buffer their output per display and emit it in one block under this lock,
+# so concurrent generations don't interleave their multi-line progress messages
+_PRINT_LOCK = threading.Lock()
+_THREAD_OUTPUT = threading.local()
+
+# Precompiled patterns for picking "Option 1" out of multi-option Gemini responses,
+# e.g. "**Option 1 (Title):**" followed by a quoted or unquoted description
+_OPT1_QUOTED = re.compile(r'\*\*Option\s+1[^:]*:\*\*\s*\n?\s*"([^"]+)"', re.DOTALL)
+_OPT1_UNQUOTED = re.compile(r'\*\*Option\s+1[^:]*:\*\*\s*\n?\s*([^*]+?)(?=\*\*Option\s+2|\n\*\*|$)', re.DOTALL)
+
+# WIDTHxHEIGHT values accepted by --resolution, e.g. "2560x1440"
+_RESOLUTION_RE = re.compile(r'(\d+)[xX](\d+)')
+
+# Default image size - 5K resolution for maximum quality on macOS displays
+DEFAULT_RESOLUTION = (5120, 2880)
+
+# Any existing "no text"-style instruction in a prompt, matched in a single case-insensitive scan
+_NO_TEXT_RE = re.compile(r'no\s+(?:text|letters|words|captions)', re.IGNORECASE)
 
-# Try to import Google Gemini dependencies for prompt enhancement
+# Executable backing each command-line wallpaper tool
+WALLPAPER_TOOL_BINARIES = {"wallpaper-cli": "wallpaper", "m-cli": "m"}
+
+# How long to wait for the Dock to respawn after a forced desktop refresh (seconds)
+DOCK_RESPAWN_TIMEOUT = 1.0
+
+# Per-user cache location (honours XDG_CACHE_HOME) and default size cap for downloaded images
+CACHE_ROOT = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "tranquilai"
+DEFAULT_CACHE_SIZE_MB = 500
+PROMPT_CACHE_DIR = CACHE_ROOT / "prompts"
+
+# Gemini model used for prompt enhancement (also part of the prompt cache key)
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+
+# Google Gemini dependencies for prompt enhancement are only looked up here; the client is
+# imported inside enhance_prompt_with_gemini() so private runs never pay for loading it
 try:
-    from google import genai
-    from dotenv import load_dotenv
-    GEMINI_AVAILABLE = True
-    # Load environment variables
-    load_dotenv()
+    GEMINI_AVAILABLE = (importlib.util.find_spec("google.genai") is not None
+                        and importlib.util.find_spec("dotenv") is not None)
 except ImportError:
     GEMINI_AVAILABLE = False
 
-# Try to import image processing dependencies
-try:
-    from PIL import Image, ImageEnhance, ImageFilter
-    import numpy as np
-    IMAGE_PROCESSING_AVAILABLE = True
-except ImportError:
-    IMAGE_PROCESSING_AVAILABLE = False
+# pyobjc frameworks are only looked up here and imported where they're used, so non-display
+# paths (--help, --generate-only) don't pay for loading AppKit and Quartz
+# Quartz for in-process display queries on macOS
+QUARTZ_AVAILABLE = importlib.util.find_spec("Quartz") is not None
+# AppKit to set wallpapers in-process on macOS
+APPKIT_AVAILABLE = (importlib.util.find_spec("AppKit") is not None
+                    and importlib.util.find_spec("Foundation") is not None)
+
+# psutil for process lookups without spawning pgrep (optional, imported in get_dock_pids())
+PSUTIL_AVAILABLE = importlib.util.find_spec("psutil") is not None
+
+# Image processing dependencies are only looked up here and imported by load_image_processing()
+# on first use, so --help, --setup and --no-enhance runs don't pay for loading them
+IMAGE_PROCESSING_AVAILABLE = (importlib.util.find_spec("PIL") is not None
+                              and importlib.util.find_spec("numpy") is not None)
+# OpenCV for faster blurring and blending (PIL filters are used otherwise)
+CV2_AVAILABLE = importlib.util.find_spec("cv2") is not None
+# numba for a compiled post-processing kernel (NumPy is used otherwise)
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
 
-def run_command(cmd, capture_output=True, shell=False):
-    """Run a command and return the result."""
+Image = ImageFilter = np = cv2 = None
+_enhance_kernel = None
+_IMAGE_LIBS_LOADED = False
+_IMAGE_LIBS_LOCK = threading.Lock()
+
+def run_command(cmd, capture_output=True):
+    """Run a command (an argv list, never through a shell) and return the result."""
     try:
-        if shell:
-            result = subprocess.run(cmd, shell=True, capture_output=capture_output, text=True)
-        else:
-            result = subprocess.run(cmd, capture_output=capture_output, text=True)
-        return result
+        return subprocess.run(cmd, capture_output=capture_output, text=True)
+    except Exception as e:
+        print(f"Error running command: {e}")
+        return None
+
+def run_silent(cmd):
+    """Run a command whose output isn't needed, discarding it instead of piping it back."""
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        print(f"Error running command: {e}")
+        return None
+
+def run_installer(cmd):
+    """Run a pip/brew/npm install, hiding its progress output but letting errors reach the terminal."""
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL)
     except Exception as e:
         print(f"Error running command: {e}")
         return None
 
-def download_image_from_pollinations(prompt, width, height, seed, model, output_file, private=False):
-    """Download image from Pollinations API"""
+def get_http_session():
+    """Return the shared requests session, creating it on first use"""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            # Ride out transient overload (429/5xx) with exponential backoff, honouring Retry-After
+            retry = Retry(
+                total=5,
+                backoff_factor=0.8,
+                status_forcelist=(429, 500, 502, 503, 504),
+                respect_retry_after_header=True,
+                allowed_methods=frozenset(['GET']),
+            )
+            
+            # Only a handful of hosts are ever contacted, but each may see many parallel requests
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                'User-Agent': 'TranquilAI/1.0 (+https://github.com/CY83R-3X71NC710N/TranquilAI)',
+                'Connection': 'keep-alive',
+            })
+            _SESSION = session
+    return _SESSION
+
+def link_or_copy(src, dst):
+    """
+    Place src at dst as cheaply as possible, replacing any existing dst.
+    Tries a hardlink, then an APFS clone on macOS, and only then a full byte copy.
+    """
+    # Nothing to do if dst already is src (e.g. --save-dir pointing at the queue directory)
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    try:
+        if os.path.samefile(src, dst):
+            return
+    except OSError:
+        pass
+    
+    # Build the new file under a temporary sibling name and swap it in, so dst is never
+    # missing or half-written if anything below fails
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        placed = False
+        
+        # Hardlinks and clones only work within one volume, e.g. not for a --save-dir on another disk
+        try:
+            same_volume = os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+        except OSError:
+            same_volume = False
+        
+        if same_volume:
+            try:
+                os.link(src, tmp_path)
+                placed = True
+            except OSError:
+                pass
+            
+            # cp -c uses clonefile(2): copy-on-write, so no data blocks are duplicated
+            if not placed and sys.platform == "darwin":
+                result = run_silent(["cp", "-c", str(src), tmp_path])
+                placed = bool(result and result.returncode == 0)
+        
+        if not placed:
+            shutil.copy2(src, tmp_path)
+        
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+
+def get_image_cache_path(cache_dir, prompt, width, height, seed, model, private=False):
+    """Return the content-addressed cache path for a Pollinations request"""
+    key = f"{model}|{width}x{height}|{seed}|{'private' if private else 'standard'}|{prompt}"
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return Path(cache_dir) / f"{digest}.jpg"
+
+def store_in_image_cache(image_path, cache_path):
+    """Atomically publish a downloaded image into the cache (hardlinked when possible)"""
+    try:
+        link_or_copy(image_path, cache_path)
+    except OSError as e:
+        print(f"⚠ Failed to cache image: {e}")
+
+def prune_image_cache(cache_dir, max_bytes):
+    """Evict least recently used cached images until the cache fits within max_bytes"""
     try:
-        # URL encode the prompt to handle special characters
-        encoded_prompt = urllib.parse.quote(prompt)
+        # Single directory pass; DirEntry carries the file type so only cached images are stat'ed
+        entries = []
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".jpg") and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
         
-        # Construct the Pollinations API URL with maximum quality settings
-        if private:
-            # Private mode - minimal parameters for privacy but still high quality
-            image_url = f"https://pollinations.ai/p/{encoded_prompt}?width={width}&height={height}&seed={seed}&model={model}&nologo=true&private=true"
-        else:
-            # Standard mode - with nologo, enhance, and maximum quality parameters
-            image_url = f"https://pollinations.ai/p/{encoded_prompt}?width={width}&height={height}&seed={seed}&model={model}&nologo=true&enhance=true&private=true&quality=high&steps=120"
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+    except Exception as e:
+        print(f"⚠ Failed to prune image cache: {e}")
+
+def preallocate_file(file, response):
+    """Reserve disk space for an uncompressed response body so the filesystem can lay it out contiguously"""
+    content_length = response.headers.get('Content-Length')
+    if not content_length or response.headers.get('Content-Encoding') or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(file.fileno(), 0, int(content_length))
+    except (OSError, ValueError):
+        pass  # Purely an optimisation - unsupported filesystems just skip it
+
+@functools.lru_cache(maxsize=32)
+def get_pollinations_url_template(prompt, width, height, model, private=False):
+    """Build the Pollinations API URL for a prompt, leaving a {seed} placeholder"""
+    import urllib.parse
+    
+    # URL encode the prompt to handle special characters (including '/', which would split the path)
+    encoded_prompt = urllib.parse.quote(prompt, safe="")
+    
+    # Construct the Pollinations API URL with maximum quality settings
+    if private:
+        # Private mode - minimal parameters for privacy but still high quality
+        return f"https://pollinations.ai/p/{encoded_prompt}?width={width}&height={height}&seed={{seed}}&model={model}&nologo=true&private=true"
+    # Standard mode - with nologo, enhance, and maximum quality parameters
+    return f"https://pollinations.ai/p/{encoded_prompt}?width={width}&height={height}&seed={{seed}}&model={model}&nologo=true&enhance=true&private=true&quality=high&steps=120"
+
+def download_image_from_pollinations(prompt, width, height, seed, model, output_file, private=False, cache_dir=None, refresh_cache=False):
+    """Download image from Pollinations API (refresh_cache skips cache lookups but still stores the result)"""
+    import requests
+    
+    try:
+        # Serve repeated requests from the local cache without touching the network
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = get_image_cache_path(cache_dir, prompt, width, height, seed, model, private)
+            if not refresh_cache and cache_path.is_file() and cache_path.stat().st_size > 0:
+                link_or_copy(cache_path, output_file)
+                os.utime(cache_path)  # Mark as recently used for LRU eviction
+                print(f"✓ Using cached image: {cache_path}")
+                return True
+        
+        # Only the seed differs between displays, so the encoded URL is built once per prompt
+        image_url = get_pollinations_url_template(prompt, width, height, model, private).format(seed=seed)
         
         print(f"Downloading image from Pollinations API...")
         print(f"  URL: {image_url}")
         
-        # Download the image
-        response = requests.get(image_url, timeout=60)
-        response.raise_for_status()  # Raise an exception for bad status codes
+        # Download into a sibling .part file so a failed transfer never leaves a truncated image
+        part_file = f"{output_file}.part"
+        try:
+            # Download the image over the shared session, streaming the body to disk
+            with get_http_session().get(image_url, timeout=60, stream=True) as response:
+                response.raise_for_status()  # Raise an exception for bad status codes
+                
+                # A matching 1 MiB file buffer coalesces short socket reads into large disk writes
+                with open(part_file, 'wb', buffering=1 << 20) as file:
+                    preallocate_file(file, response)
+                    
+                    # Copy the raw socket stream to the file through a fixed 1 MiB buffer
+                    response.raw.decode_content = True  # Transparently undo any gzip/deflate encoding
+                    shutil.copyfileobj(response.raw, file, length=1 << 20)
+                    bytes_written = file.tell()
+                    file.truncate()  # Drop any preallocated tail the body didn't fill
+            
+            # Verify the download actually produced content
+            if bytes_written == 0:
+                print("✗ Image download failed - empty response")
+                return False
+            
+            os.replace(part_file, output_file)
+        finally:
+            if os.path.exists(part_file):
+                os.unlink(part_file)
         
-        # Write the content to the output file
-        with open(output_file, 'wb') as file:
-            file.write(response.content)
+        print(f"✓ Image downloaded successfully: {output_file}")
         
-        # Verify the file was created and has content
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"✓ Image downloaded successfully: {output_file}")
-            return True
-        else:
-            print("✗ Image download failed - file not created or empty")
-            return False
+        # Keep a hardlinked copy in the cache (no extra disk space on the same volume)
+        if cache_path is not None:
+            store_in_image_cache(output_file, cache_path)
+        return True
             
     except requests.exceptions.RequestException as e:
         print(f"✗ Network error downloading image: {str(e)}")
@@ -92,13 +321,58 @@ def download_image_from_pollinations(prompt, width, height, seed, model, output_
         print(f"✗ Error downloading image: {str(e)}")
         return False
 
-def enhance_prompt_with_gemini(user_prompt):
+def get_prompt_cache_path(user_prompt, model=GEMINI_MODEL):
+    """Content-addressed cache file for a Gemini-enhanced prompt"""
+    # NUL can't appear in either part, so different (model, prompt) pairs never share a key
+    key = hashlib.sha256(f"{model}\0{user_prompt}".encode("utf-8")).hexdigest()
+    return PROMPT_CACHE_DIR / f"{key}.txt"
+
+def get_cached_prompt(user_prompt, model=GEMINI_MODEL):
+    """Return the cached enhancement of a prompt, or None on a miss"""
+    try:
+        return get_prompt_cache_path(user_prompt, model).read_text(encoding="utf-8") or None
+    except OSError:
+        return None
+
+def cache_prompt(user_prompt, enhanced_prompt, model=GEMINI_MODEL):
+    """Store an enhanced prompt, writing to a temp file first so an interrupted run can't leave a partial entry"""
+    cache_path = get_prompt_cache_path(user_prompt, model)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(enhanced_prompt, encoding="utf-8")
+            os.replace(tmp_path, cache_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    except OSError as e:
+        print(f"  ⚠ Could not cache enhanced prompt: {str(e)}")
+
+@functools.lru_cache(maxsize=1)
+def get_gemini_client(api_key):
+    """Return a Gemini client for the API key, reusing it (and its HTTP transport) across calls"""
+    # Only import the (heavy) Gemini client once we know it will be used
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+def enhance_prompt_with_gemini(user_prompt, use_cache=True):
     """Enhance user prompt using Gemini 2.5 Pro for better AI wallpaper generation"""
+    if use_cache:
+        cached_prompt = get_cached_prompt(user_prompt)
+        if cached_prompt:
+            print(f"  ✓ Enhanced (cached): {cached_prompt[:100]}...")
+            return cached_prompt
+    
     try:
         if not GEMINI_AVAILABLE:
             print("  Gemini not available, using original prompt")
             return add_no_text_instruction(user_prompt)
         
+        # Load environment variables (the API key usually lives in .env)
+        from dotenv import load_dotenv
+        load_dotenv()
+        
         api_key = os.getenv('GOOGLE_API_KEY')
         if not api_key:
             print("  No Gemini API key found, using original prompt")
@@ -112,7 +386,7 @@ def enhance_prompt_with_gemini(user_prompt):
             print("Both GOOGLE_API_KEY and GEMINI_API_KEY are set. Using GOOGLE_API_KEY.")
         
         # Configure Gemini
-        client = genai.Client(api_key=api_key)
+        client = get_gemini_client(api_key)
         
         # Create enhancement prompt
         enhancement_prompt = f"""You are an expert AI art prompt engineer. Your task is to enhance the following user prompt to create stunning, high-quality wallpapers.
@@ -134,7 +408,7 @@ Enhanced prompt:"""
 
         # Generate enhanced prompt
         response = client.models.generate_content(
-            model='gemini-2.0-flash-exp',
+            model=GEMINI_MODEL,
             contents=enhancement_prompt
         )
         
@@ -146,6 +420,9 @@ Enhanced prompt:"""
         # Ensure no text instruction is included
         enhanced_prompt = add_no_text_instruction(enhanced_prompt)
         print(f"  ✓ Enhanced: {enhanced_prompt[:100]}...")
+        
+        # Remember the result so re-runs with the same prompt skip the round trip
+        cache_prompt(user_prompt, enhanced_prompt)
         return enhanced_prompt
         
     except Exception as e:
@@ -153,27 +430,18 @@ Enhanced prompt:"""
         print("  Using original prompt")
         return add_no_text_instruction(user_prompt)
 
-def generate_wallpaper(prompt, width, height, seed, output_file, private=False, no_enhance=False):
-    """Generate wallpaper using Gemini-enhanced prompts and Pollinations API"""
+def generate_wallpaper(prompt, width, height, seed, output_file, private=False, no_enhance=False, cache_dir=None, refresh_cache=False):
+    """Generate wallpaper from an already enhanced (or no-text-tagged) prompt using the Pollinations API"""
     try:
         print(f"Generating wallpaper...")
         print(f"  Model: Pollinations AI (Flux)")
         print(f"  Resolution: {width}x{height}")
         print(f"  Seed: {seed}")
         print(f"  Private mode: {'Yes' if private else 'No'}")
-        print(f"  Original prompt: {prompt}")
-        
-        # Enhance prompt with Gemini if available and not in private mode
-        if not private:
-            enhanced_prompt = enhance_prompt_with_gemini(prompt)
-        else:
-            print("  Private mode: skipping prompt enhancement")
-            enhanced_prompt = add_no_text_instruction(prompt)
-        
-        print(f"  Final prompt: {enhanced_prompt}")
+        print(f"  Final prompt: {prompt}")
         
         # Download the image first
-        download_success = download_image_from_pollinations(enhanced_prompt, width, height, seed, "flux", output_file, private)
+        download_success = download_image_from_pollinations(prompt, width, height, seed, "flux", output_file, private, cache_dir, refresh_cache)
         
         if download_success and not no_enhance:
             # Apply post-processing effects to enhance image quality
@@ -191,16 +459,24 @@ def generate_wallpaper(prompt, width, height, seed, output_file, private=False,
 
 def install_wallpaper_tool():
     """Install a wallpaper setting tool"""
+    # Reuse an already installed tool - a PATH lookup is far cheaper than npm/brew
+    if shutil.which("wallpaper"):
+        print("✓ wallpaper-cli is already available")
+        return "wallpaper-cli"
+    if shutil.which("m"):
+        print("✓ m-cli is already available")
+        return "m-cli"
+    
     print("Installing wallpaper setting tool...")
     
     # Try wallpaper-cli first
-    result = run_command(["npm", "install", "-g", "wallpaper-cli"])
+    result = run_installer(["npm", "install", "-g", "wallpaper-cli"])
     if result and result.returncode == 0:
         print("✓ wallpaper-cli installed successfully")
         return "wallpaper-cli"
     
     # Try m-cli as alternative
-    result = run_command(["brew", "install", "m-cli"])
+    result = run_installer(["brew", "install", "m-cli"])
     if result and result.returncode == 0:
         print("✓ m-cli installed successfully")
         return "m-cli"
@@ -208,48 +484,103 @@ def install_wallpaper_tool():
     print("Using AppleScript as fallback")
     return "applescript"
 
+@functools.lru_cache(maxsize=None)
+def find_executable(name):
+    """Locate an executable on PATH, memoized for the lifetime of the process"""
+    return shutil.which(name)
+
 def check_wallpaper_tool(tool):
     """Check if a wallpaper tool is available."""
-    if tool == "wallpaper-cli":
-        result = run_command(["which", "wallpaper"])
-        return result and result.returncode == 0
-    elif tool == "m-cli":
-        result = run_command(["which", "m"])
-        return result and result.returncode == 0
-    elif tool == "applescript":
+    if tool == "applescript":
         return True  # AppleScript is always available on macOS
-    return False
+    if tool == "nsworkspace":
+        return APPKIT_AVAILABLE
+    binary = WALLPAPER_TOOL_BINARIES.get(tool)
+    return binary is not None and find_executable(binary) is not None
+
+def resolve_wallpaper_tool(tool=None):
+    """Resolve 'auto' (or None) to the preferred installed wallpaper tool"""
+    if tool in WALLPAPER_SETTERS:
+        return tool
+    for candidate in ("nsworkspace", "wallpaper-cli", "m-cli"):
+        if check_wallpaper_tool(candidate):
+            return candidate
+    return "applescript"
+
+@functools.lru_cache(maxsize=1)
+def get_display_info():
+    """
+    Get the number of connected displays and the main display's pixel resolution.
+    Prefers in-process Quartz/AppKit queries and falls back to a single AppleScript call.
+    """
+    count = None
+    resolution = None
+    
+    if QUARTZ_AVAILABLE:
+        try:
+            from Quartz import CGGetActiveDisplayList
+            err, _, active_count = CGGetActiveDisplayList(16, None, None)
+            if err == 0 and active_count > 0:
+                count = active_count
+        except Exception:
+            pass
+        try:
+            from Quartz import (
+                CGMainDisplayID,
+                CGDisplayCopyDisplayMode,
+                CGDisplayModeGetPixelWidth,
+                CGDisplayModeGetPixelHeight,
+            )
+            # Native pixel size of the current mode (not the scaled point size on Retina displays)
+            mode = CGDisplayCopyDisplayMode(CGMainDisplayID())
+            width = int(CGDisplayModeGetPixelWidth(mode))
+            height = int(CGDisplayModeGetPixelHeight(mode))
+            if width > 0 and height > 0:
+                resolution = (width, height)
+        except Exception:
+            pass
+    
+    if (count is None or resolution is None) and APPKIT_AVAILABLE:
+        try:
+            from AppKit import NSScreen
+            screens = NSScreen.screens()
+            if screens:
+                count = count or len(screens)
+                # Frames are in points, so scale by the backing factor to get pixels
+                main_screen = screens[0]
+                frame = main_screen.frame()
+                scale = main_screen.backingScaleFactor()
+                resolution = resolution or (int(frame.size.width * scale), int(frame.size.height * scale))
+        except Exception:
+            pass
+    
+    if count is None or resolution is None:
+        try:
+            # One osascript process for both values, printed as "count, left, top, right, bottom"
+            script = '''
+            tell application "System Events" to set desktopCount to count (every desktop)
+            tell application "Finder" to set desktopBounds to bounds of window of desktop
+            return {desktopCount} & desktopBounds
+            '''
+            result = run_command(["osascript", "-e", script])
+            if result and result.returncode == 0:
+                values = [int(value) for value in result.stdout.strip().split(", ")]
+                if len(values) >= 5:
+                    count = count or values[0]
+                    resolution = resolution or (values[3], values[4])
+        except Exception:
+            pass
+    
+    # Default to 1 display at 5K resolution for maximum quality on macOS
+    return count or 1, resolution or DEFAULT_RESOLUTION
 
 def get_display_count():
-    """Get number of connected displays using AppleScript"""
-    try:
-        result = run_command([
-            "osascript", "-e",
-            'tell application "System Events" to count (every desktop)'
-        ])
-        if result and result.returncode == 0:
-            return int(result.stdout.strip())
-    except:
-        pass
-    return 1  # Default to 1 display if detection fails
+    """Get number of connected displays"""
+    return get_display_info()[0]
 
 def get_display_resolution():
-    """Get the primary display resolution."""
-    try:
-        result = run_command([
-            "osascript", "-e",
-            'tell application "Finder" to get bounds of window of desktop'
-        ])
-        if result and result.returncode == 0:
-            # Parse output like "0, 0, 1920, 1080"
-            bounds = result.stdout.strip().split(", ")
-            if len(bounds) >= 4:
-                width = int(bounds[2])
-                height = int(bounds[3])
-                return width, height
-    except:
-        pass
-    return 5120, 2880  # Default to 5K resolution for maximum quality on macOS
+    """Get the main display resolution"""
+    return get_display_info()[1]
 
 def set_wallpaper(image_path, display_index=None, tool=None):
     """Set wallpaper using the best available method"""
@@ -259,38 +590,97 @@ def set_wallpaper(image_path, display_index=None, tool=None):
         print(f"✗ Image file not found: {abs_image_path}")
         return False
     
-    print(f"Setting wallpaper using {tool or 'auto-detect'}: {abs_image_path}")
+    tool = resolve_wallpaper_tool(tool)
+    print(f"Setting wallpaper using {tool}: {abs_image_path}")
     
-    # Try different methods in order of preference
-    methods = []
+    # Dispatch straight to the resolved tool, keeping AppleScript as the built-in fallback
+    methods = [tool] if tool == "applescript" else [tool, "applescript"]
     
-    if tool == "wallpaper-cli":
-        methods = [("wallpaper-cli", lambda p, d: set_wallpaper_wallpaper_cli(p, d))]
-    elif tool == "m-cli":
-        methods = [("m-cli", lambda p, d: set_wallpaper_m_cli(p, d))]
-    elif tool == "applescript":
-        methods = [("AppleScript", lambda p, d: set_wallpaper_applescript(p, d))]
-    else:
-        # Auto-detect best method
-        methods = [
-            ("wallpaper-cli", lambda p, d: set_wallpaper_wallpaper_cli(p, d)),
-            ("m-cli", lambda p, d: set_wallpaper_m_cli(p, d)),
-            ("AppleScript", lambda p, d: set_wallpaper_applescript(p, d))
-        ]
-    
-    for method_name, method_func in methods:
-        if check_wallpaper_tool(method_name):
-            try:
-                if method_func(abs_image_path, display_index):
-                    print(f"✓ Wallpaper set successfully using {method_name}")
-                    return True
-            except Exception as e:
-                print(f"✗ {method_name} failed: {e}")
-                continue
+    for method_name in methods:
+        if not check_wallpaper_tool(method_name):
+            print(f"✗ {method_name} is not installed")
+            continue
+        try:
+            if WALLPAPER_SETTERS[method_name](abs_image_path, display_index):
+                print(f"✓ Wallpaper set successfully using {method_name}")
+                return True
+        except Exception as e:
+            print(f"✗ {method_name} failed: {e}")
     
     print("✗ All wallpaper setting methods failed")
     return False
 
+def set_wallpapers_bulk(paths_by_display, tool=None):
+    """Set wallpapers for several displays, batching AppleScript into a single osascript call"""
+    abs_paths = {}
+    for display_index, image_path in sorted(paths_by_display.items()):
+        abs_image_path = os.path.abspath(image_path)
+        if os.path.exists(abs_image_path):
+            abs_paths[display_index] = abs_image_path
+        else:
+            print(f"✗ Image file not found: {abs_image_path}")
+    
+    if not abs_paths:
+        return False
+    
+    # AppleScript can set every desktop in one process; the CLI tools need one call per display
+    tool = resolve_wallpaper_tool(tool)
+    
+    if tool == "applescript":
+        print(f"Setting {len(abs_paths)} wallpaper(s) using AppleScript")
+        if set_wallpapers_applescript_bulk(abs_paths):
+            print(f"✓ Wallpapers set successfully using AppleScript")
+            return True
+        print("✗ Bulk AppleScript failed, falling back to per-display setting")
+    
+    if tool == "nsworkspace":
+        # In-process AppKit calls take microseconds - no point in fanning out to threads
+        return all([set_wallpaper(image_path, display_index, tool) for display_index, image_path in abs_paths.items()])
+    
+    # The per-display tool invocations are independent, so overlap their process start-up
+    max_workers = min(len(abs_paths), MAX_CONCURRENT_DOWNLOADS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda item: set_wallpaper(item[1], item[0], tool),
+            abs_paths.items()
+        ))
+    return all(results)
+
+def applescript_quote(text):
+    """Quote a Python string as an AppleScript string literal"""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def set_wallpapers_applescript_bulk(paths_by_display):
+    """Set wallpapers for several displays with one AppleScript invocation"""
+    try:
+        items = sorted(paths_by_display.items())
+        display_list = ", ".join(str(display_index) for display_index, _ in items)
+        path_list = ", ".join(applescript_quote(image_path) for _, image_path in items)
+        
+        # Loop over AppleScript lists so the script stays the same size whatever the display
+        # count, and skip indexes beyond the connected desktops instead of aborting the batch
+        script = f'''
+            set displayIndexes to {{{display_list}}}
+            set wallpaperPaths to {{{path_list}}}
+            tell application "System Events"
+                set desktopCount to count of desktops
+                repeat with i from 1 to count of displayIndexes
+                    set displayIndex to item i of displayIndexes
+                    if displayIndex <= desktopCount then
+                        tell desktop displayIndex
+                            set picture to item i of wallpaperPaths
+                        end tell
+                    end if
+                end repeat
+            end tell
+            '''
+        
+        result = run_silent(["osascript", "-e", script])
+        return result and result.returncode == 0
+    except Exception as e:
+        print(f"AppleScript error: {e}")
+        return False
+
 def set_wallpaper_applescript(image_path, display_index=None):
     """Set wallpaper using AppleScript (built-in macOS method)"""
     try:
@@ -299,7 +689,7 @@ def set_wallpaper_applescript(image_path, display_index=None):
             script = f'''
             tell application "System Events"
                 tell desktop {display_index}
-                    set picture to "{image_path}"
+                    set picture to {applescript_quote(image_path)}
                 end tell
             end tell
             '''
@@ -307,16 +697,40 @@ def set_wallpaper_applescript(image_path, display_index=None):
             # For all displays
             script = f'''
             tell application "Finder"
-                set desktop picture to POSIX file "{image_path}"
+                set desktop picture to POSIX file {applescript_quote(image_path)}
             end tell
             '''
         
-        result = run_command(["osascript", "-e", script])
+        result = run_silent(["osascript", "-e", script])
         return result and result.returncode == 0
     except Exception as e:
         print(f"AppleScript error: {e}")
         return False
 
+def set_wallpaper_nsworkspace(image_path, display_index=None):
+    """Set wallpaper in-process through NSWorkspace (no osascript or helper tool needed)"""
+    try:
+        from AppKit import NSScreen, NSWorkspace
+        from Foundation import NSURL
+        url = NSURL.fileURLWithPath_(image_path)
+        screens = list(NSScreen.screens())
+        if display_index is not None:
+            if not 1 <= display_index <= len(screens):
+                print(f"NSWorkspace error: display {display_index} not found ({len(screens)} connected)")
+                return False
+            screens = [screens[display_index - 1]]
+        
+        workspace = NSWorkspace.sharedWorkspace()
+        for screen in screens:
+            success, error = workspace.setDesktopImageURL_forScreen_options_error_(url, screen, {}, None)
+            if not success:
+                print(f"NSWorkspace error: {error}")
+                return False
+        return True
+    except Exception as e:
+        print(f"NSWorkspace error: {e}")
+        return False
+
 def set_wallpaper_wallpaper_cli(image_path, display_index=None):
     """Set wallpaper using wallpaper-cli"""
     try:
@@ -327,7 +741,7 @@ def set_wallpaper_wallpaper_cli(image_path, display_index=None):
         else:
             cmd = ["wallpaper", image_path]
         
-        result = run_command(cmd)
+        result = run_silent(cmd)
         return result and result.returncode == 0
     except Exception as e:
         print(f"wallpaper-cli error: {e}")
@@ -341,20 +755,130 @@ def set_wallpaper_m_cli(image_path, display_index=None):
         else:
             cmd = ["m", "wallpaper", image_path]
         
-        result = run_command(cmd)
+        result = run_silent(cmd)
         return result and result.returncode == 0
     except Exception as e:
         print(f"m-cli error: {e}")
         return False
 
+# Per-display setter for each supported wallpaper tool
+WALLPAPER_SETTERS = {
+    "nsworkspace": set_wallpaper_nsworkspace,
+    "wallpaper-cli": set_wallpaper_wallpaper_cli,
+    "m-cli": set_wallpaper_m_cli,
+    "applescript": set_wallpaper_applescript,
+}
+
+def get_dock_pids():
+    """Return the PIDs of the current user's Dock (other logged-in users each run their own)"""
+    uid = os.getuid()
+    if PSUTIL_AVAILABLE:
+        try:
+            import psutil
+            return {
+                proc.info['pid'] for proc in psutil.process_iter(['pid', 'name', 'uids'])
+                if proc.info['name'] == "Dock" and proc.info['uids'] and proc.info['uids'].real == uid
+            }
+        except Exception:
+            pass
+    
+    result = run_command(["pgrep", "-u", str(uid), "-x", "Dock"])
+    if not result or result.returncode != 0:
+        return set()
+    return {int(pid) for pid in result.stdout.split()}
+
 def refresh_desktop():
-    """Refresh desktop to apply wallpaper changes"""
+    """
+    Restart the Dock to force wallpaper changes to apply.
+    Returns the PIDs of the old Dock so the caller can wait for its replacement later,
+    or None if the restart could not be started.
+    """
     try:
-        run_command(["killall", "Dock"])
-        time.sleep(1)
-        print("✓ Desktop refreshed")
-    except:
+        old_pids = get_dock_pids()
+        if not old_pids:
+            print("⚠ Dock is not running, nothing to refresh")
+            return None
+        
+        # Signal the Dock directly - launchd respawns it; no killall process needed
+        for pid in old_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+        print("✓ Desktop refresh started")
+        return old_pids
+    except Exception:
         print("⚠ Could not refresh desktop")
+        return None
+
+def wait_for_desktop_refresh(old_pids, timeout=DOCK_RESPAWN_TIMEOUT):
+    """Poll until a new Dock process has replaced the old one, giving up after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = get_dock_pids()
+        if pids and not pids & old_pids:
+            return True
+        time.sleep(0.05)
+    return False
+
+def cpu_supports_avx2():
+    """Check whether this is an x86-64 CPU with AVX2 (required for Pillow-SIMD's fast paths)"""
+    if platform.machine().lower() not in ("x86_64", "amd64"):
+        return False
+    try:
+        if sys.platform == "darwin":
+            result = run_command(["sysctl", "-n", "machdep.cpu.leaf7_features"])
+            return bool(result and result.returncode == 0 and "AVX2" in result.stdout.upper())
+        with open("/proc/cpuinfo") as cpuinfo:
+            return " avx2" in cpuinfo.read()
+    except Exception:
+        return False
+
+def pip_install_command(*packages):
+    """Build a pip install command; --user is refused inside a virtualenv."""
+    cmd = [sys.executable, "-m", "pip", "install", *packages]
+    if sys.prefix == sys.base_prefix:
+        cmd.append("--user")
+    return cmd
+
+def install_pillow_simd():
+    """
+    Replace Pillow with the API-compatible Pillow-SIMD build on AVX2-capable machines.
+    Pillow-SIMD is built as a wheel first; Pillow is only replaced once that succeeds.
+    """
+    try:
+        import PIL
+    except ImportError:
+        return False
+    
+    if ".post" in PIL.__version__:  # Pillow-SIMD releases are versioned X.Y.Z.postN
+        print("✓ Pillow-SIMD is already installed")
+        return True
+    
+    if not cpu_supports_avx2():
+        return False
+    
+    import tempfile
+    print("Installing Pillow-SIMD for faster image processing...")
+    with tempfile.TemporaryDirectory() as wheel_dir:
+        # Build first so a failed compile leaves the working Pillow in place
+        result = run_installer([sys.executable, "-m", "pip", "wheel", "pillow-simd", "--no-deps", "-w", wheel_dir])
+        wheels = list(Path(wheel_dir).glob("*.whl"))
+        if not result or result.returncode != 0 or not wheels:
+            print("⚠ Failed to build Pillow-SIMD (needs a compiler plus libjpeg/zlib headers), keeping Pillow")
+            return False
+        
+        run_installer([sys.executable, "-m", "pip", "uninstall", "-y", "Pillow"])
+        result = run_installer(pip_install_command(str(wheels[0])))
+    if result and result.returncode == 0:
+        print("✓ Pillow-SIMD installed successfully")
+        return True
+    
+    print("⚠ Failed to install Pillow-SIMD, restoring Pillow")
+    result = run_installer(pip_install_command("Pillow"))
+    if not result or result.returncode != 0:
+        print("⚠ Failed to reinstall Pillow. Please run: pip install Pillow")
+    return False
 
 def setup_dependencies():
     """Set up all required dependencies."""
@@ -366,21 +890,34 @@ def setup_dependencies():
         print("✓ requests library is already available")
     except ImportError:
         print("Installing requests library...")
-        result = run_command([sys.executable, "-m", "pip", "install", "requests", "--user"])
+        result = run_installer(pip_install_command("requests"))
         if not result or result.returncode != 0:
             print("Failed to install requests. Please run: pip install requests --user")
             return False
         else:
             print("✓ requests installed successfully")
     
-    # Check Gemini dependencies
+    # Check Gemini dependencies, probing the same imports the enhancement code uses
+    missing_gemini = []
     try:
-        import google.generativeai as genai
-        from dotenv import load_dotenv
-        print("✓ Gemini dependencies are available")
+        from google import genai
+        # "google" is a namespace shared with protobuf, google-auth and others, so also confirm
+        # the google-genai distribution itself is installed (PackageNotFoundError is an ImportError)
+        import importlib.metadata
+        importlib.metadata.version("google-genai")
+    except ImportError:
+        missing_gemini.append("google-genai")
+    try:
+        import dotenv
     except ImportError:
-        print("Installing Gemini dependencies...")
-        result = run_command([sys.executable, "-m", "pip", "install", "google-generativeai", "python-dotenv", "--user"])
+        missing_gemini.append("python-dotenv")
+    
+    if not missing_gemini:
+        print("✓ Gemini dependencies are available")
+    else:
+        # Install whatever is missing in a single pip run
+        print(f"Installing Gemini dependencies ({', '.join(missing_gemini)})...")
+        result = run_installer(pip_install_command(*missing_gemini))
         if not result or result.returncode != 0:
             print("⚠ Failed to install Gemini dependencies. Prompt enhancement will be disabled.")
         else:
@@ -388,7 +925,7 @@ def setup_dependencies():
     
     # Check image processing dependencies
     try:
-        from PIL import Image, ImageEnhance, ImageFilter
+        from PIL import Image, ImageFilter
         import numpy as np
         print("✓ Image processing dependencies are available")
         # Check for scipy for advanced grain reduction
@@ -397,14 +934,72 @@ def setup_dependencies():
             print("✓ Advanced grain reduction (scipy) is available")
         except ImportError:
             print("⚠ scipy not found - advanced grain reduction will use fallback method")
+        # Check for OpenCV for fast blurring
+        try:
+            import cv2
+            print("✓ Fast image filtering (OpenCV) is available")
+        except ImportError:
+            print("Installing OpenCV for faster image processing...")
+            result = run_installer(pip_install_command("opencv-python-headless"))
+            if not result or result.returncode != 0:
+                print("⚠ Failed to install OpenCV. Post-processing will use PIL filters.")
+            else:
+                print("✓ OpenCV installed successfully")
+        # Check for numba for the compiled enhancement kernel
+        try:
+            import numba
+            print("✓ Compiled post-processing (numba) is available")
+        except ImportError:
+            print("Installing numba for faster image processing...")
+            result = run_installer(pip_install_command("numba"))
+            if not result or result.returncode != 0:
+                print("⚠ Failed to install numba. Post-processing will use NumPy.")
+            else:
+                print("✓ numba installed successfully")
     except ImportError:
         print("Installing image processing dependencies...")
-        result = run_command([sys.executable, "-m", "pip", "install", "Pillow", "numpy", "scipy", "--user"])
+        result = run_installer(pip_install_command("Pillow", "numpy", "scipy", "opencv-python-headless", "numba"))
         if not result or result.returncode != 0:
             print("⚠ Failed to install image processing dependencies. Post-processing will be disabled.")
         else:
             print("✓ Image processing dependencies installed successfully")
     
+    # Swap in Pillow-SIMD where the CPU can use its AVX2 kernels
+    install_pillow_simd()
+    
+    # Check for jpegoptim to shrink post-processed wallpapers
+    if find_executable("jpegoptim"):
+        print("✓ JPEG optimization (jpegoptim) is available")
+    elif sys.platform == "darwin" and find_executable("brew"):
+        print("Installing jpegoptim via Homebrew...")
+        result = run_installer(["brew", "install", "jpegoptim"])
+        if result and result.returncode == 0:
+            find_executable.cache_clear()
+            print("✓ jpegoptim installed successfully")
+        else:
+            print("⚠ Failed to install jpegoptim - wallpapers will be saved without extra optimization")
+    else:
+        print("⚠ jpegoptim not found - wallpapers will be saved without extra optimization")
+    
+    # Check for AppKit (pyobjc) for setting wallpapers without spawning osascript
+    if sys.platform == "darwin":
+        if APPKIT_AVAILABLE:
+            print("✓ In-process wallpaper setting (NSWorkspace) is available")
+        else:
+            print("Installing pyobjc-framework-Cocoa for in-process wallpaper setting...")
+            result = run_installer(pip_install_command("pyobjc-framework-Cocoa"))
+            if not result or result.returncode != 0:
+                print("⚠ Failed to install pyobjc-framework-Cocoa - wallpapers will be set with external tools")
+            else:
+                print("✓ pyobjc-framework-Cocoa installed successfully (used from the next run)")
+    
+    # Check for Quartz (pyobjc) for fast in-process display detection
+    if sys.platform == "darwin":
+        if QUARTZ_AVAILABLE:
+            print("✓ Fast display detection (Quartz) is available")
+        else:
+            print("⚠ pyobjc-framework-Quartz not found - display detection will use AppleScript")
+    
     # Install wallpaper tool
     tool = install_wallpaper_tool()
     
@@ -421,6 +1016,8 @@ def enhance_image_quality(image_path, output_path=None):
         return image_path
     
     try:
+        load_image_processing()
+        
         # Use input path as output if not specified
         if output_path is None:
             output_path = image_path
@@ -438,28 +1035,19 @@ def enhance_image_quality(image_path, output_path=None):
             if img.mode != 'RGB':
                 img = img.convert('RGB')
             
-            # Apply gentle enhancements
-            enhanced_img = img.copy()
-            
-            # 1. Adaptive brightness adjustment
-            enhanced_img = apply_adaptive_brightness(enhanced_img)
-            
-            # 2. Gentle contrast enhancement
-            contrast_enhancer = ImageEnhance.Contrast(enhanced_img)
-            enhanced_img = contrast_enhancer.enhance(1.05)  # Very gentle 5% contrast boost
-            
-            # 3. Subtle color saturation boost
-            color_enhancer = ImageEnhance.Color(enhanced_img)
-            enhanced_img = color_enhancer.enhance(1.08)  # Gentle 8% saturation boost
+            enhanced_img = apply_enhancements(img)
             
-            # 4. Light noise reduction
-            enhanced_img = apply_gentle_noise_reduction(enhanced_img)
-            
-            # 5. Subtle sharpening for clarity
-            enhanced_img = apply_subtle_sharpening(enhanced_img)
-            
-            # Save with high quality settings
-            enhanced_img.save(output_path, 'JPEG', quality=95, optimize=True, progressive=True)
+            # Save with high quality settings, swapping the result in atomically so that
+            # hardlinked copies of the original (e.g. the image cache) are left untouched
+            # Pillow's optimize pass is slow, so leave entropy optimisation to jpegoptim
+            tmp_path = f"{output_path}.tmp"
+            try:
+                enhanced_img.save(tmp_path, 'JPEG', quality=95, optimize=False, progressive=True, subsampling=2)
+                optimize_jpeg(tmp_path)
+                os.replace(tmp_path, output_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
             
         print("  ✓ Natural enhancement applied successfully")
         return output_path
@@ -469,77 +1057,146 @@ def enhance_image_quality(image_path, output_path=None):
         print("  Using original image")
         return image_path
 
-def apply_adaptive_brightness(img):
-    """Apply intelligent brightness adjustment based on image characteristics"""
-    try:
-        # Analyze image brightness
-        img_array = np.array(img)
-        mean_brightness = np.mean(img_array)
-        
-        # Apply conservative brightness adjustments only when needed
-        if mean_brightness < 100:  # Very dark image
-            brightness_enhancer = ImageEnhance.Brightness(img)
-            img = brightness_enhancer.enhance(1.15)  # 15% boost
-        elif mean_brightness < 120:  # Somewhat dark
-            brightness_enhancer = ImageEnhance.Brightness(img)
-            img = brightness_enhancer.enhance(1.08)  # 8% boost
-        elif mean_brightness > 220:  # Very bright
-            brightness_enhancer = ImageEnhance.Brightness(img)
-            img = brightness_enhancer.enhance(0.95)  # 5% reduction
-        
-        return img
-    except Exception:
-        return img
+def optimize_jpeg(image_path):
+    """Losslessly shrink a JPEG with jpegoptim (if installed) - optimal Huffman tables, no metadata"""
+    if not find_executable("jpegoptim"):
+        return False
+    result = run_silent(["jpegoptim", "--quiet", "--strip-all", "--all-progressive", image_path])
+    return bool(result and result.returncode == 0)
 
-def apply_gentle_noise_reduction(img):
-    """Apply light noise reduction without losing detail"""
-    try:
-        # Very gentle blur for noise reduction
-        denoised = img.filter(ImageFilter.GaussianBlur(radius=0.3))
-        
-        # Convert to arrays
-        original_array = np.array(img).astype(np.float32)
-        denoised_array = np.array(denoised).astype(np.float32)
-        
-        # Blend original with denoised (favor original)
-        blend_factor = 0.15  # Only 15% denoising
-        result_array = (original_array * (1 - blend_factor) + denoised_array * blend_factor)
-        result_array = np.clip(result_array, 0, 255).astype(np.uint8)
-        
-        return Image.fromarray(result_array)
-    except Exception:
-        return img
+# Gentle enhancement settings
+CONTRAST_FACTOR = 1.05  # Very gentle 5% contrast boost
+SATURATION_FACTOR = 1.08  # Gentle 8% saturation boost
+DENOISE_RADIUS = 0.3
+DENOISE_BLEND = 0.15  # Only 15% denoising
+SHARPEN_RADIUS = 0.8
+SHARPEN_STRENGTH = 0.25  # Much gentler than a standard unsharp mask
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)  # ITU-R 601-2, as used by PIL's "L" conversion
+BRIGHTNESS_PROBE_FACTOR = 16  # Downsampling factor for the mean-brightness probe
 
-def apply_subtle_sharpening(img):
-    """Apply very gentle sharpening to enhance clarity without artifacts"""
-    try:
-        # Create a very gentle unsharp mask
-        blurred = img.filter(ImageFilter.GaussianBlur(radius=0.8))
-        
-        original_array = np.array(img).astype(np.float32)
-        blurred_array = np.array(blurred).astype(np.float32)
-        
-        # Calculate edge detail
-        detail_mask = original_array - blurred_array
-        
-        # Apply very subtle sharpening
-        sharpening_strength = 0.25  # Much gentler than before
-        sharpened_array = original_array + (detail_mask * sharpening_strength)
-        sharpened_array = np.clip(sharpened_array, 0, 255).astype(np.uint8)
-        
-        return Image.fromarray(sharpened_array)
-    except Exception:
-        return img
+def get_brightness_factor(mean_brightness):
+    """Pick a conservative brightness multiplier based on the image's mean brightness"""
+    if mean_brightness < 100:  # Very dark image
+        return 1.15  # 15% boost
+    if mean_brightness < 120:  # Somewhat dark
+        return 1.08  # 8% boost
+    if mean_brightness > 220:  # Very bright
+        return 0.95  # 5% reduction
+    return 1.0
+
+def gaussian_blur(arr, radius):
+    """Blur a uint8 RGB array, using OpenCV's SIMD kernels when available"""
+    if CV2_AVAILABLE:
+        return cv2.GaussianBlur(arr, (0, 0), sigmaX=radius)
+    return np.asarray(Image.fromarray(arr).filter(ImageFilter.GaussianBlur(radius=radius)))
+
+def load_image_processing():
+    """Import PIL, NumPy and the optional OpenCV/numba accelerators on first use"""
+    global Image, ImageFilter, np, cv2, _enhance_kernel, _IMAGE_LIBS_LOADED, CV2_AVAILABLE, NUMBA_AVAILABLE
+    if _IMAGE_LIBS_LOADED:
+        return
+    with _IMAGE_LIBS_LOCK:
+        if _IMAGE_LIBS_LOADED:
+            return
+        from PIL import Image, ImageFilter
+        import numpy as np
+        if CV2_AVAILABLE:
+            try:
+                import cv2
+            except ImportError:
+                CV2_AVAILABLE = False
+        if NUMBA_AVAILABLE:
+            try:
+                _enhance_kernel = build_enhance_kernel()
+            except ImportError:
+                NUMBA_AVAILABLE = False
+        _IMAGE_LIBS_LOADED = True
+
+def build_enhance_kernel():
+    """Compile (or load from numba's on-disk cache) the fused per-pixel enhancement kernel"""
+    import numba
+    
+    # nogil rather than parallel=True: displays are already processed on a thread pool, and
+    # numba's default workqueue layer hangs at exit when parallel kernels run off the main thread
+    @numba.njit(nogil=True, fastmath=True, cache=True)
+    def _enhance_kernel(src, denoised, blurred, out, source_weight, denoise_weight,
+                        sharpen_strength, scale, offset, saturation):
+        """Per-pixel version of apply_enhancements' NumPy path, fused into a single loop"""
+        height, width, _ = src.shape
+        for y in range(height):
+            for x in range(width):
+                r = (source_weight * src[y, x, 0] + denoise_weight * denoised[y, x, 0]
+                     - sharpen_strength * blurred[y, x, 0]) * scale + offset
+                g = (source_weight * src[y, x, 1] + denoise_weight * denoised[y, x, 1]
+                     - sharpen_strength * blurred[y, x, 1]) * scale + offset
+                b = (source_weight * src[y, x, 2] + denoise_weight * denoised[y, x, 2]
+                     - sharpen_strength * blurred[y, x, 2]) * scale + offset
+                grey = (1.0 - saturation) * (0.299 * r + 0.587 * g + 0.114 * b)
+                out[y, x, 0] = min(max(r * saturation + grey, 0.0), 255.0)
+                out[y, x, 1] = min(max(g * saturation + grey, 0.0), 255.0)
+                out[y, x, 2] = min(max(b * saturation + grey, 0.0), 255.0)
+    
+    return _enhance_kernel
+
+def apply_enhancements(img):
+    """
+    Apply brightness, contrast, saturation, noise reduction and sharpening in one float32 pass
+    The steps are all linear, so they are folded into a single blend plus one affine tone curve
+    """
+    src = np.asarray(img)
+    
+    # The global statistics only pick a brightness band and a contrast pivot,
+    # so a 16x box-downsampled thumbnail is plenty (256x fewer pixels to read)
+    thumb = img.reduce(max(1, min(BRIGHTNESS_PROBE_FACTOR, *img.size)))
+    channel_means = np.asarray(thumb).reshape(-1, 3).mean(axis=0)
+    brightness = get_brightness_factor(channel_means.mean())
+    # ImageEnhance.Contrast pivots around the mean grey level of the (brightened) image
+    contrast_pivot = brightness * float(np.dot(channel_means, LUMA_WEIGHTS))
+    
+    # Noise reduction followed by unsharp masking:
+    #   d = (1 - k) * x + k * blur(x, 0.3);  out = d + s * (d - blur(d, 0.8))
+    # blur(d, 0.8) is close enough to blur(x, 0.8) that the pair collapses into one blend
+    source_weight = (1 + SHARPEN_STRENGTH) * (1 - DENOISE_BLEND)
+    denoise_weight = (1 + SHARPEN_STRENGTH) * DENOISE_BLEND
+    denoised = gaussian_blur(src, DENOISE_RADIUS)
+    blurred = gaussian_blur(src, SHARPEN_RADIUS)
+    scale = brightness * CONTRAST_FACTOR
+    offset = contrast_pivot * (1 - CONTRAST_FACTOR)
+    
+    if NUMBA_AVAILABLE:
+        out = np.empty_like(src)
+        _enhance_kernel(src, denoised, blurred, out, source_weight, denoise_weight,
+                        SHARPEN_STRENGTH, scale, offset, SATURATION_FACTOR)
+        return Image.fromarray(out)
+    
+    if CV2_AVAILABLE:
+        arr = cv2.addWeighted(src, source_weight, denoised, denoise_weight, 0, dtype=cv2.CV_32F)
+        arr = cv2.addWeighted(arr, 1.0, blurred, -SHARPEN_STRENGTH, 0, dtype=cv2.CV_32F)
+    else:
+        arr = src.astype(np.float32)
+        arr *= source_weight
+        arr += np.multiply(denoised, denoise_weight, dtype=np.float32)
+        arr -= np.multiply(blurred, SHARPEN_STRENGTH, dtype=np.float32)
+    
+    # Brightness and contrast: c * (b * x - m) + m
+    arr *= scale
+    arr += offset
+    
+    # Saturation: blend each pixel away from its own grey level
+    luma = arr @ np.asarray(LUMA_WEIGHTS, dtype=np.float32)
+    luma *= 1 - SATURATION_FACTOR
+    arr *= SATURATION_FACTOR
+    arr += luma[..., np.newaxis]
+    
+    np.clip(arr, 0, 255, out=arr)
+    return Image.fromarray(arr.astype(np.uint8))
 
 
 
 def add_no_text_instruction(prompt):
     """Add 'no text' instruction to any prompt to ensure clean wallpapers"""
     # Add the instruction if not already present
-    no_text_keywords = ['no text', 'no letters', 'no words', 'no captions']
-    prompt_lower = prompt.lower()
-    
-    if not any(keyword in prompt_lower for keyword in no_text_keywords):
+    if not _NO_TEXT_RE.search(prompt):
         prompt += ", no text, no letters, no words, no captions"
     
     return prompt
@@ -554,12 +1211,8 @@ def parse_gemini_response(response_text):
         if "**Option" in response_text or "Option 1" in response_text:
             print("  Multiple options detected, selecting the first one...")
             
-            # Look for patterns like "**Option 1 (Title):**" or "Option 1:"
-            import re
-            
             # First try to find the content between quotes for Option 1
-            option_pattern = r'\*\*Option\s+1[^:]*:\*\*\s*\n?\s*"([^"]+)"'
-            match = re.search(option_pattern, response_text, re.DOTALL)
+            match = _OPT1_QUOTED.search(response_text)
             
             if match:
                 selected_option = match.group(1).strip()
@@ -567,8 +1220,7 @@ def parse_gemini_response(response_text):
                 return selected_option
             
             # Alternative pattern without quotes but with clear option boundary
-            option_pattern = r'\*\*Option\s+1[^:]*:\*\*\s*\n?\s*([^*]+?)(?=\*\*Option\s+2|\n\*\*|$)'
-            match = re.search(option_pattern, response_text, re.DOTALL)
+            match = _OPT1_UNQUOTED.search(response_text)
             
             if match:
                 selected_option = match.group(1).strip()
@@ -619,13 +1271,115 @@ def parse_gemini_response(response_text):
         print("  Using original response")
         return response_text.strip()
 
+def derive_display_seed(prompt, display_idx, base_seed=None):
+    """
+    Pick the Pollinations seed for a display.
+    Random by default; with a base seed it is derived from a hash so repeat runs are reproducible.
+    """
+    if base_seed is None:
+        return random.randint(1, 2147483647)  # Use max int32 value for compatibility
+    
+    digest = hashlib.blake2b(f"{base_seed}|{prompt}|{display_idx}".encode(), digest_size=8).digest()
+    return (int.from_bytes(digest, 'big') & 0x7FFFFFFF) or 1
+
+def plan_display_tasks(prompt, displays, output_dir, queue_dir, base_seed=None):
+    """
+    Work out the (display index, seed, output file, queue file) for every display up front,
+    so the per-display jobs share nothing and can run in any order.
+    """
+    # One timestamp for the whole run keeps each batch's files grouped together
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    
+    tasks = []
+    for display_idx in range(1, displays + 1):
+        # Use random seed for uniqueness and variety, or a well-spread reproducible one with --seed
+        seed = derive_display_seed(prompt, display_idx, base_seed)
+        # Timestamped output preserves wallpaper history; the unique queue name avoids caching issues
+        filename = f"wallpaper_display_{display_idx}_{timestamp}.jpg"
+        tasks.append((display_idx, seed, output_dir / filename, queue_dir / filename))
+    return tasks
+
+class ThreadBufferedStdout:
+    """Stdout proxy that holds a thread's writes in its buffer while one is active."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+    
+    def write(self, text):
+        buffer = getattr(_THREAD_OUTPUT, "buffer", None)
+        if buffer is not None:
+            buffer.append(text)
+            return len(text)
+        with _PRINT_LOCK:
+            return self.stream.write(text)
+    
+    def flush(self):
+        self.stream.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def generate_display_wallpaper(task, prompt, width, height, private=False, no_enhance=False, cache_dir=None, refresh_cache=False):
+    """
+    Generate the wallpaper for a single display task and copy it into the queue.
+    Returns the queue file path on success, or None if generation failed.
+    """
+    display_idx, seed, output_file, queue_file = task
+    # Only concurrent runs install the buffering proxy; a lone display prints as it goes
+    buffered = isinstance(sys.stdout, ThreadBufferedStdout)
+    if buffered:
+        # One line straight away so a long download doesn't look like a hang
+        print(f"  Display {display_idx}: started")
+        _THREAD_OUTPUT.buffer = []
+    try:
+        print(f"\n--- Display {display_idx} ---")
+        
+        if not generate_wallpaper(prompt, width, height, seed, str(output_file), private, no_enhance, cache_dir, refresh_cache):
+            print(f"✗ Failed to generate wallpaper for display {display_idx}")
+            return None
+        
+        try:
+            # Hardlink when possible - both paths normally live on the same volume
+            link_or_copy(str(output_file), str(queue_file))
+            print(f"✓ Saved timestamped copy: {output_file}")
+            print(f"✓ Created queue file: {queue_file}")
+        except Exception as e:
+            print(f"⚠ Failed to copy to queue: {e}")
+        
+        return queue_file
+    finally:
+        if buffered:
+            # Emit this display's messages as one uninterrupted block
+            output = "".join(_THREAD_OUTPUT.buffer)
+            _THREAD_OUTPUT.buffer = None
+            sys.stdout.write(output)
+            sys.stdout.flush()
+
+def find_queued_wallpaper(queue_dir, display_idx):
+    """Return the most recently queued wallpaper for a display, or None if there is none"""
+    matching_files = list(Path(queue_dir).glob(f"wallpaper_display_{display_idx}_*.jpg"))
+    if not matching_files:
+        return None
+    # Names end in a %Y%m%d_%H%M%S timestamp, so the newest file sorts last - no stat() needed
+    return max(matching_files, key=lambda f: f.name)
+
+def parse_resolution(value):
+    """argparse type for --resolution: 'WIDTHxHEIGHT', or 'auto' to match the main display"""
+    if value.strip().lower() == "auto":
+        return get_display_resolution()
+    match = _RESOLUTION_RE.fullmatch(value.strip())
+    if not match or not all(int(side) > 0 for side in match.groups()):
+        raise argparse.ArgumentTypeError(f"invalid resolution '{value}' - use a format like 1920x1080 or 'auto'")
+    return int(match.group(1)), int(match.group(2))
+
 def main():
     parser = argparse.ArgumentParser(description="TranquilAI - Generate serene AI wallpapers using Gemini-enhanced prompts and Pollinations")
     parser.add_argument("prompt", nargs='?', help="Text prompt for image generation")
     parser.add_argument("--displays", type=int, help="Number of displays (auto-detect if not specified)")
     parser.add_argument("--save-dir", help="Directory to save copies of generated images")
-    parser.add_argument("--resolution", help="Image resolution (e.g., 1920x1080, 2560x1440)")
-    parser.add_argument("--tool", choices=["wallpaper-cli", "m-cli", "applescript", "auto"], 
+    parser.add_argument("--resolution", type=parse_resolution, default=DEFAULT_RESOLUTION,
+                       help="Image resolution (e.g., 1920x1080, 2560x1440), or 'auto' to match the main display (default: 5120x2880)")
+    parser.add_argument("--tool", choices=["nsworkspace", "wallpaper-cli", "m-cli", "applescript", "auto"], 
                        default="auto", help="Wallpaper setting tool to use")
     parser.add_argument("--queue-dir", default="./queued-images", help="Directory for queued wallpaper images")
     parser.add_argument("--setup", action="store_true", help="Install required dependencies")
@@ -635,6 +1389,18 @@ def main():
                        help="Enable private generation mode (no prompt enhancement, minimal parameters)")
     parser.add_argument("--no-enhance", action="store_true",
                        help="Disable post-processing image enhancement effects")
+    parser.add_argument("--force-refresh", action="store_true",
+                       help="Restart the Dock after setting wallpapers (only needed if changes don't show up)")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENT_DOWNLOADS,
+                       help=f"Maximum number of displays generated in parallel (default: {MAX_CONCURRENT_DOWNLOADS}, max: {HTTP_POOL_SIZE})")
+    parser.add_argument("--seed", type=int,
+                       help="Base seed for reproducible wallpapers (random if not specified)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE_MB,
+                       help=f"Maximum size of the downloaded image cache in MB, 0 disables it (default: {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument("--no-image-cache", action="store_true",
+                       help="Download images again instead of reusing cached ones")
+    parser.add_argument("--no-prompt-cache", action="store_true",
+                       help="Ask Gemini again instead of reusing a cached prompt enhancement")
     
     args = parser.parse_args()
     
@@ -659,16 +1425,11 @@ def main():
         print("Or run: python3 wallpaper_generator.py --setup")
         sys.exit(1)
     
-    # Determine resolution
-    if args.resolution:
-        try:
-            width, height = map(int, args.resolution.split('x'))
-        except ValueError:
-            print("Invalid resolution format. Use format like: 1920x1080")
-            sys.exit(1)
-    else:
-        # Use 5K resolution for maximum quality on macOS
-        width, height = 5120, 2880  # 5K resolution - highest quality for macOS displays
+    # Parsed (and validated) by argparse; display detection only runs for --resolution auto
+    width, height = args.resolution
+    
+    # Resolve the wallpaper tool once instead of re-probing for every display
+    tool = resolve_wallpaper_tool(args.tool)
     
     # Determine number of displays
     displays = args.displays or get_display_count()
@@ -676,6 +1437,7 @@ def main():
     print(f"Generating wallpapers for {displays} display(s)")
     print(f"Resolution: {width}x{height}")
     print(f"Engine: Pollinations AI (Flux){' with Gemini enhancement' if not args.private and GEMINI_AVAILABLE else ''}")
+    print(f"Wallpaper tool: {tool}")
     print(f"Post-processing: {'Enabled' if not args.no_enhance and IMAGE_PROCESSING_AVAILABLE else 'Disabled'}")
     
     # Create directories
@@ -687,53 +1449,85 @@ def main():
     saved_dir.mkdir(exist_ok=True)
     
     if args.save_dir:
-        save_dir = Path(args.save_dir)
-        save_dir.mkdir(exist_ok=True)
+        output_dir = Path(args.save_dir)
+        output_dir.mkdir(exist_ok=True)
+    else:
+        output_dir = saved_dir
+    
+    # Cache of raw downloads, keyed by the full Pollinations request
+    cache_dir = None
+    if args.cache_size > 0:
+        cache_dir = CACHE_ROOT / "images"
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            # The cache is only an optimisation - carry on without it
+            print(f"⚠ Image cache unavailable ({e}), downloading without it")
+            cache_dir = None
+    
+    # Every display uses the same prompt, so enhance it once up front
+    print(f"\n=== Preparing Prompt ===")
+    print(f"  Original prompt: {args.prompt}")
+    if not args.private:
+        enhanced_prompt = enhance_prompt_with_gemini(args.prompt, use_cache=not args.no_prompt_cache)
+    else:
+        print("  Private mode: skipping prompt enhancement")
+        enhanced_prompt = add_no_text_instruction(args.prompt)
     
-    # Generate new wallpapers
+    # Generate new wallpapers concurrently - each display is an independent, network-bound job
     print(f"\n=== Generating New Wallpapers ===")
-    success_count = 0
     
-    for display_idx in range(1, displays + 1):
-        print(f"\n--- Display {display_idx} ---")
-        
-        # Use random seed for uniqueness and variety
-        seed = random.randint(1, 2147483647)  # Use max int32 value for compatibility
-        
-        # Always create timestamped files to preserve wallpaper history
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        
-        # Output file with timestamp to preserve all wallpapers
-        if args.save_dir:
-            output_file = save_dir / f"wallpaper_display_{display_idx}_{timestamp}.jpg"
-        else:
-            output_file = saved_dir / f"wallpaper_display_{display_idx}_{timestamp}.jpg"
+    tasks = plan_display_tasks(args.prompt, displays, output_dir, queue_dir, args.seed)
+    
+    max_workers = max(1, min(displays, args.max_concurrency, HTTP_POOL_SIZE))
+    real_stdout = sys.stdout
+    if max_workers > 1:
+        sys.stdout = ThreadBufferedStdout(real_stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            queue_files = list(executor.map(
+                lambda task: generate_display_wallpaper(
+                    task, enhanced_prompt, width, height,
+                    args.private, args.no_enhance, cache_dir, args.no_image_cache
+                ),
+                tasks
+            ))
+    finally:
+        sys.stdout = real_stdout
+    
+    generated = {
+        display_idx: str(queue_file)
+        for display_idx, queue_file in enumerate(queue_files, start=1)
+        if queue_file is not None
+    }
+    success_count = len(generated)
+    
+    # Set all wallpapers in one go (if not generate-only mode). Displays whose generation
+    # failed fall back to their most recently queued wallpaper, so each display is set once.
+    if not args.generate_only:
+        wallpapers = dict(generated)
+        for display_idx in range(1, displays + 1):
+            if display_idx in wallpapers:
+                continue
+            queued_file = find_queued_wallpaper(queue_dir, display_idx)
+            if queued_file is not None:
+                print(f"Using queued wallpaper for display {display_idx}: {queued_file}")
+                wallpapers[display_idx] = str(queued_file)
         
-        # Generate wallpaper
-        if generate_wallpaper(args.prompt, width, height, seed, str(output_file), args.private, args.no_enhance):
-            success_count += 1
-            
-            # Create unique queue filename to avoid caching issues
-            queue_file = queue_dir / f"wallpaper_display_{display_idx}_{timestamp}.jpg"
-            try:
-                shutil.copy2(str(output_file), str(queue_file))
-                print(f"✓ Saved timestamped copy: {output_file}")
-                print(f"✓ Created queue file: {queue_file}")
-            except Exception as e:
-                print(f"⚠ Failed to copy to queue: {e}")
-            
-            # Set the newly generated wallpaper immediately (if not generate-only mode)
-            if not args.generate_only:
-                set_wallpaper(str(queue_file), display_idx, args.tool)
-        else:
-            print(f"✗ Failed to generate wallpaper for display {display_idx}")
+        if wallpapers:
+            set_wallpapers_bulk(wallpapers, tool)
+    
+    if cache_dir is not None:
+        prune_image_cache(cache_dir, args.cache_size * 1024 * 1024)
     
     print(f"\n=== Summary ===")
     print(f"Successfully generated {success_count}/{displays} wallpapers")
     
-    # Refresh desktop after all wallpapers are set
-    if success_count > 0 and not args.generate_only:
-        refresh_desktop()
+    # Wallpapers set via AppleScript or the CLI tools apply immediately; only restart the
+    # Dock when explicitly requested, and let it respawn while we wrap up
+    old_dock_pids = None
+    if success_count > 0 and not args.generate_only and args.force_refresh:
+        old_dock_pids = refresh_desktop()
     
     if success_count > 0:
         print("✓ Wallpaper generation completed successfully")
@@ -741,6 +1535,9 @@ def main():
             print("Images saved to queue directory for future use")
         else:
             print("New wallpapers have been set automatically")
+        
+        if old_dock_pids is not None and not wait_for_desktop_refresh(old_dock_pids):
+            print("⚠ Desktop refresh is taking longer than expected")
     else:
         print("✗ No wallpapers were generated successfully")
         sys.exit(1)